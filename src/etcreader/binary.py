@@ -10,10 +10,14 @@
     :license: BSD, see LICENSE for more details.
 """
 
+import functools
 import struct
 from typing import (
     Annotated,
     Any,
+    Callable,
+    Mapping,
+    NamedTuple,
     NewType,
     TypedDict,
     _TypedDictMeta,  # type: ignore
@@ -22,6 +26,7 @@ from typing import (
     get_type_hints,
 )
 
+import numpy as np
 from typing_extensions import Buffer
 
 #################
@@ -48,6 +53,15 @@ type PrimaryTypes = PAD | BOOL | CHAR | U8 | U16 | U32 | U64 | I8 | I16 | I32 |
 
 _PrimaryTypesList = get_args(PrimaryTypes.__value__)
 
+_PRIMARY_SET = frozenset(_PrimaryTypesList)
+
+_PRIMARY_CODE = {
+    PAD: "x", BOOL: "?", CHAR: "c",
+    U8: "B", U16: "H", U32: "I", U64: "Q",
+    I8: "b", I16: "h", I32: "i", I64: "q",
+    F16: "e", F32: "f", F64: "d",
+}
+
 
 #########################
 # Base TypedDict classes
@@ -112,60 +126,426 @@ def get_byte_order(cls: type, default: str="=") -> str:
     return default
 
 
+@functools.lru_cache(maxsize=None)
+def _byte_order_of(cls: type) -> str:
+    """Cached version of get_byte_order.
+    """
+    return get_byte_order(cls)
+
+
+@functools.lru_cache(maxsize=None)
+def _hints_of(cls: type) -> tuple[tuple[str, Any], ...]:
+    """Return the public fields of a TypedDict and their types,
+    resolving type hints only once per class.
+    """
+    return tuple(
+        (k, v)
+        for k, v in get_type_hints(cls, include_extras=True).items()
+        if not k.startswith("_")
+    )
+
+
 def build_format(primary_type: type[PrimaryTypes], byte_order: str, length: int=1) -> str:
     """Build a struct compact format string.
     """
-    if primary_type is PAD:
-        return byte_order + "x" * length 
-    elif primary_type is BOOL:
-        return byte_order + "?" * length 
-    elif primary_type is U8:
-        return byte_order + "B" * length
-    elif primary_type is U16:    
-        return byte_order + "H" * length 
-    elif primary_type is U32:
-        return byte_order + "I" * length 
-    elif primary_type is U64:
-        return byte_order + "Q" * length 
-    elif primary_type is I8:
-        return byte_order + "b" * length
-    elif primary_type is I16:    
-        return byte_order + "h" * length 
-    elif primary_type is I32:
-        return byte_order + "i" * length 
-    elif primary_type is I64:
-        return byte_order + "q" * length 
-    elif primary_type is F16:
-        return byte_order + "e" * length 
-    elif primary_type is F32:
-        return byte_order + "f" * length 
-    elif primary_type is F64:
-        return byte_order + "d" * length 
-    elif primary_type is CHAR:
-        return byte_order + "c" * length  
-    elif primary_type is CHAR_ARRAY:
-        return byte_order + f"{length}s" 
-    else:
-        raise ValueError(f"Unknown pod_type: {primary_type}") 
+    if primary_type is CHAR_ARRAY:
+        return byte_order + f"{length}s"
+    try:
+        return byte_order + _PRIMARY_CODE[primary_type] * length
+    except KeyError:
+        raise ValueError(f"Unknown pod_type: {primary_type}") from None
     
 
 class ConsumeBuffer:
     """Thin wrapper around a buffer that keeps track of the cursor position.
     """
 
-    def __init__(self, buffer: Buffer) -> None:
+    def __init__(self, buffer: Buffer, offset: int=0) -> None:
         self._buffer = buffer
-        self._offset = 0
+        self._offset = offset
 
-    def unpack(self, fmt: str) -> tuple[Any, ...]:
+    def unpack(self, s: struct.Struct) -> tuple[Any, ...]:
         """Read from the buffer, and updates the cursor position based
-        on the fmt size.
+        on the compiled struct size.
         """
-        delta = struct.calcsize(fmt)
-        content = struct.unpack_from(fmt, self._buffer, self._offset)
-        self._offset += delta
+        content = s.unpack_from(self._buffer, self._offset)
+        self._offset += s.size
         return content
-    
+
+    def read_char_array(self, length: int) -> bytes:
+        """Read a char array from the buffer, and updates the cursor
+        position based on its length.
+        """
+        content = _read_char_array(self._buffer, self._offset, length)
+        self._offset += length
+        return content
+
+
+#######################
+# Compiled structures
+#######################
+
+_DTYPE_CACHE: dict[type, np.dtype | None] = {}
+
+_NUMPY_BYTE_ORDER = {"@": "=", "=": "=", "<": "<", ">": ">", "!": ">"}
+
+_NUMPY_CODE = {
+    BOOL: "?", CHAR: "S1",
+    U8: "u1", U16: "u2", U32: "u4", U64: "u8",
+    I8: "i1", I16: "i2", I32: "i4", I64: "i8",
+    F16: "f2", F32: "f4", F64: "f8",
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _compiled(fmt: str) -> struct.Struct:
+    """Return a compiled struct for a given format string.
+    """
+    return struct.Struct(fmt)
+
+
+@functools.lru_cache(maxsize=None)
+def _struct_of(
+        primary_type: type[PrimaryTypes],
+        byte_order: str,
+        length: int=1
+        ) -> struct.Struct:
+    """Return a compiled struct for a primary type.
+
+    Not used for char arrays, as their lengths are read from the buffer
+    and would grow the cache without bound (see `_read_char_array`).
+    """
+    return _compiled(build_format(primary_type, byte_order, length))
+
+
+def _read_char_array(buffer: Buffer, offset: int, length: int) -> bytes:
+    """Read a char array from the buffer at a given offset.
+    """
+    content = bytes(buffer[offset:offset + length])  # type: ignore
+    if len(content) != length:
+        raise struct.error(
+            f"unpack_from requires a buffer of at least {offset + length} bytes"
+        )
+    return content
+
+
+def _static_format(fmt: Any) -> str | None:
+    """Return the struct format code (without byte order character)
+    of a field which size is known in advance, or None otherwise.
+    """
+    if fmt in _PRIMARY_SET:
+        return build_format(fmt, "", length=1)
+
+    if get_origin(fmt) is Annotated:
+        subfmt, length = get_args(fmt)
+        if isinstance(length, str) or length == 0 or subfmt not in _PRIMARY_SET:
+            return None
+        if subfmt is not CHAR_ARRAY and length != 1:
+            return None
+        return build_format(subfmt, "", length)
+
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _primary_dtype(primary_type: type[PrimaryTypes], byte_order: str) -> np.dtype:
+    """Return the numpy dtype of a fixed size primary type.
+    """
+    return np.dtype(_NUMPY_BYTE_ORDER.get(byte_order, "=") + _NUMPY_CODE[primary_type])
+
+
+def _get_dtype(cls: type) -> np.dtype | None:
+    """Return a structured numpy dtype equivalent to a TypedDict,
+    or None if any of its fields is not a fixed size primary type.
+    """
+    try:
+        return _DTYPE_CACHE[cls]
+    except KeyError:
+        pass
+
+    byte_order = _byte_order_of(cls)
+    fields: list[tuple[str, str]] | None = []
+    for k, v in _hints_of(cls):
+        if v not in _NUMPY_CODE:
+            fields = None
+            break
+        fields.append((k, _NUMPY_BYTE_ORDER[byte_order] + _NUMPY_CODE[v]))
+
+    if fields:
+        out = np.dtype(fields, align=byte_order == "@")
+    else:
+        out = None
+    _DTYPE_CACHE[cls] = out
+    return out
+
+
+#########################
+# Compiled read steps
+#########################
+
+type Builder = Callable[[dict[str, Any]], Any]
+
+class ReadStruct(NamedTuple):
+    """Read consecutive fields of known size with a single struct.
+    """
+    names: tuple[str, ...]
+    compiled: struct.Struct
+
+    def exec(self, buffer: Buffer, offset: int, record: dict[str, Any]) -> int:
+        compiled = self.compiled
+        record.update(zip(self.names, compiled.unpack_from(buffer, offset)))
+        return offset + compiled.size
+
+
+class ReadCharArray(NamedTuple):
+    """Read a char array which length is given by a previous field.
+    """
+    name: str
+    length: int | str
+
+    def exec(self, buffer: Buffer, offset: int, record: dict[str, Any]) -> int:
+        length = self.length
+        if isinstance(length, str):
+            length = record[length]
+        if not length:
+            record[self.name] = None
+            return offset
+        record[self.name] = _read_char_array(buffer, offset, length)
+        return offset + length
+
+
+class ReadPrefixedCharArray(NamedTuple):
+    """Read consecutive fields of known size, followed by a char array
+    which length is given by the last of them.
+    """
+    names: tuple[str, ...]
+    compiled: struct.Struct
+    name: str
+
+    def exec(self, buffer: Buffer, offset: int, record: dict[str, Any]) -> int:
+        compiled = self.compiled
+        values = compiled.unpack_from(buffer, offset)
+        offset += compiled.size
+        record.update(zip(self.names, values))
+        length = values[-1]
+        if not length:
+            record[self.name] = None
+            return offset
+        record[self.name] = _read_char_array(buffer, offset, length)
+        return offset + length
+
+
+class ReadArray(NamedTuple):
+    """Read a list of items of known size as a numpy array.
+
+    When the items are records of a class with a builder, `_run`
+    reads them as a list instead.
+    """
+    name: str
+    length: int | str
+    dtype: np.dtype
+    cls: type | None
+
+    def exec(self, buffer: Buffer, offset: int, record: dict[str, Any]) -> int:
+        length = self.length
+        if isinstance(length, str):
+            length = record[length]
+        if length < 0:
+            # numpy would read up to the end of the buffer.
+            raise ValueError(f"Invalid length {length} for field {self.name}")
+        dtype = self.dtype
+        record[self.name] = np.frombuffer(
+            buffer, dtype=dtype, count=length, offset=offset
+        )
+        return offset + length * dtype.itemsize
+
+
+class ReadList(NamedTuple):
+    """Read a list of records.
+
+    Handled directly by `_run`.
+    """
+    name: str
+    length: int | str
+    cls: type
+
+
+class ReadDict(NamedTuple):
+    """Read a nested record.
+
+    Handled directly by `_run`.
+    """
+    name: str
+    cls: type
+
+
+class ReadField(NamedTuple):
+    """Read any other field using the generic reader.
+    """
+    name: str
+    fmt: Any
+    byte_order: str
+
+    def exec(self, buffer: Buffer, offset: int, record: dict[str, Any]) -> int:
+        consumer = ConsumeBuffer(buffer, offset)
+        record[self.name] = _read(self.fmt, consumer, self.byte_order, record)
+        return consumer._offset
+
+
+type Step = (
+    ReadStruct | ReadCharArray | ReadPrefixedCharArray
+    | ReadArray | ReadList | ReadDict | ReadField
+)
+
+_SCHEMA_CACHE: dict[type, tuple[Step, ...]] = {}
+
+
+def _compile_field(name: str, fmt: Any, byte_order: str, previous: list[str]) -> Step:
+    """Compile a field which size is not known in advance into a step.
+    """
+    if is_typed_dict(fmt):
+        _compile_schema(fmt)
+        return ReadDict(name, fmt)
+
+    if get_origin(fmt) is Annotated:
+        subfmt, length = get_args(fmt)
+        if isinstance(length, str) and length not in previous:
+            raise ValueError(f"Could not find field {length} in record.")
+
+        if subfmt is CHAR_ARRAY:
+            return ReadCharArray(name, length)
+
+        if get_origin(subfmt) is list and get_args(subfmt)[0] in _NUMPY_CODE:
+            dtype = _primary_dtype(get_args(subfmt)[0], byte_order)
+            return ReadArray(name, length, dtype, None)
+
+        if get_origin(subfmt) is list and is_typed_dict(get_args(subfmt)[0]):
+            subfmt = get_args(subfmt)[0]
+            _compile_schema(subfmt)
+            dtype = _get_dtype(subfmt)
+            if dtype is not None:
+                return ReadArray(name, length, dtype, subfmt)
+            return ReadList(name, length, subfmt)
+
+    return ReadField(name, fmt, byte_order)
+
+
+def _compile_schema(cls: type) -> tuple[Step, ...]:
+    """Compile the fields of a TypedDict into a program of read steps.
+
+    Consecutive fields of known size are merged into a single compiled
+    struct, together with a following char array when its length is
+    given by the last of them. Nested records are compiled eagerly.
+
+    Programs are cached per class, so the typing introspection is done
+    only once.
+    """
+    try:
+        return _SCHEMA_CACHE[cls]
+    except KeyError:
+        pass
+
+    byte_order = _byte_order_of(cls)
+    program: list[Step] = []
+    previous: list[str] = []
+    names: list[str] = []
+    codes: list[str] = []
+    for k, v in _hints_of(cls):
+        code = _static_format(v)
+        if code is None:
+            step = _compile_field(k, v, byte_order, previous)
+            if names:
+                compiled = _compiled(byte_order + "".join(codes))
+                if isinstance(step, ReadCharArray) and step.length == names[-1]:
+                    # Length prefixed strings are read in a single step.
+                    step = ReadPrefixedCharArray(tuple(names), compiled, step.name)
+                else:
+                    program.append(ReadStruct(tuple(names), compiled))
+                names.clear()
+                codes.clear()
+            program.append(step)
+        else:
+            names.append(k)
+            codes.append(code)
+        previous.append(k)
+
+    if names:
+        program.append(ReadStruct(tuple(names), _compiled(byte_order + "".join(codes))))
+
+    out = _SCHEMA_CACHE[cls] = tuple(program)
+    return out
+
+
+def _run(
+        program: tuple[Step, ...],
+        buffer: Buffer,
+        offset: int,
+        builders: Mapping[type, Builder]
+        ) -> tuple[dict[str, Any], int]:
+    """Read a record by running a compiled program from a given offset,
+    returning the record and the offset after it.
+
+    Nested records of a class found in `builders` are converted by the
+    corresponding function as soon as they are read. Lists of such
+    records are never read as numpy arrays.
+
+    The offset is kept as a local variable and passed to each step,
+    instead of being updated in a ConsumeBuffer.
+
+    Nested records and lists of records are read by pushing the state
+    of the enclosing record on an explicit stack instead of recursing.
+    """
+    # Each frame is (program, ip, record, step, length, items)
+    stack: list[tuple[
+        tuple[Step, ...],
+        int,
+        dict[str, Any],
+        ReadList | ReadArray | ReadDict,
+        int,
+        list[Any],
+    ]] = []
+    record: dict[str, Any] = {}
+    ip = 0
+    while True:
+        while ip < len(program):
+            step = program[ip]
+            ip += 1
+            kind = type(step)
+            if kind is ReadList or (kind is ReadArray and step.cls in builders):
+                length = step.length
+                if isinstance(length, str):
+                    length = record[length]
+                if length < 0:
+                    raise ValueError(f"Invalid length {length} for field {step.name}")
+                if not length:
+                    record[step.name] = []
+                    continue
+                stack.append((program, ip, record, step, length, []))
+                program, ip, record = _SCHEMA_CACHE[step.cls], 0, {}
+            elif kind is ReadDict:
+                stack.append((program, ip, record, step, 1, []))
+                program, ip, record = _SCHEMA_CACHE[step.cls], 0, {}
+            else:
+                offset = step.exec(buffer, offset, record)
+
+        if not stack:
+            return record, offset
+
+        # A nested record is complete.
+        parent_program, parent_ip, parent_record, step, length, items = stack[-1]
+        builder = builders.get(step.cls)
+        items.append(record if builder is None else builder(record))
+        if len(items) < length:
+            ip, record = 0, {}
+            continue
+
+        stack.pop()
+        if type(step) is ReadDict:
+            parent_record[step.name] = items[0]
+        else:
+            parent_record[step.name] = tuple(items)
+        program, ip, record = parent_program, parent_ip, parent_record
+
 
 def _read(
         fmt: type[PrimaryTypes | ByteOrderSizeAlignment], 
@@ -190,9 +570,8 @@ def _read(
     -------
         _description_
     """
-    if fmt in _PrimaryTypesList:
-        subfmt = build_format(fmt, byte_order, length=1)
-        return buffer.unpack(subfmt)[0]
+    if fmt in _PRIMARY_SET:
+        return buffer.unpack(_struct_of(fmt, byte_order))[0]
     
     elif get_origin(fmt) is Annotated:
         subfmt, length = get_args(fmt)
@@ -215,11 +594,11 @@ def _read(
                 return []
             return None
         
-        if subfmt in _PrimaryTypesList:
-            if subfmt is not CHAR_ARRAY:
-                assert length == 1
-            subfmt2 = build_format(subfmt, byte_order, length)
-            content = buffer.unpack(subfmt2)[0]
+        if subfmt in _PRIMARY_SET:
+            if subfmt is CHAR_ARRAY:
+                return buffer.read_char_array(length)
+            assert length == 1
+            content = buffer.unpack(_struct_of(subfmt, byte_order, length))[0]
             return content
         else:
             return tuple(
@@ -228,21 +607,29 @@ def _read(
             )
         
     elif is_typed_dict(fmt):
-        byte_order = get_byte_order(fmt)
-        record = {}
-        for k, v in get_type_hints(fmt, include_extras=True).items():
-            if k.startswith("_"):
-                continue
-            record[k] =_read(v, buffer, byte_order, record) 
+        program = _compile_schema(fmt)
+        record, buffer._offset = _run(program, buffer._buffer, buffer._offset, {})
         return record
     
     else:
         raise ValueError(f"Unknown format {fmt}")
 
 
-def read[T: ByteOrderSizeAlignment](spec: type[T], buffer: Buffer) -> T:
-    """
+def read[T: ByteOrderSizeAlignment](
+        spec: type[T],
+        buffer: Buffer,
+        builders: Mapping[type, Builder] | None=None
+        ) -> T:
+    """Read a buffer following a spec.
+
+    Records of a TypedDict class found in `builders` are converted
+    by the corresponding function as soon as they are read, and the
+    function output is stored instead of the record.
     """
+    if is_typed_dict(spec):
+        builders = builders or {}
+        record, _ = _run(_compile_schema(spec), buffer, 0, builders)
+        if spec in builders:
+            return builders[spec](record)
+        return record  # type: ignore
     return _read(spec, ConsumeBuffer(buffer), "n")
-
-
@@ -1,14 +1,18 @@
 
 import dataclasses
 import datetime
+import enum
+import mmap
 import pathlib
 import struct
-from itertools import chain
 from typing import Literal
 
+import numpy as np
+
+from . import lowlevel
 from .binary import F64, I32, I64, build_format
 from .binary import read as llread
-from .lowlevel import ContainerFile, byte_order_sigil
+from .lowlevel import byte_order_sigil
 
 type MeasContext = Literal["Unknown", "Decay", "TRES", "AnisoDecay", "DecayTempSeries", "DecayTimeSeries",
                      "FluorSpec", "ExSpec", "FluorAnisoSpec", "ExAnisoSpec", "FluorSpecTimeSeries",
@@ -18,15 +22,63 @@ type CurveType = Literal["IRF", "Decay", "Spectrum", "Arbitrary"]
 type AnisotropyType = Literal["VH", "VV", "VM", "HH", "HV", "HM", "AA"]
 
 
-def safe_decode_str(s: bytes | None) -> str:
+class MeasContextValue(enum.IntEnum):
+    Unknown = 0
+    Decay = 1
+    TRES = 2
+    AnisoDecay = 3
+    DecayTempSeries = 4
+    DecayTimeSeries = 5
+    FluorSpec = 6
+    ExSpec = 7
+    FluorAnisoSpec = 8
+    ExAnisoSpec = 9
+    FluorSpecTimeSeries = 10
+    ExSpecTimeSeries = 11
+    FluorSpecTempSeries = 12
+    ExSpecTempSeries = 13
+
+
+class CurveTypeValue(enum.IntEnum):
+    IRF = 0
+    Decay = 1
+    Spectrum = 2
+    Arbitrary = 3
+
+
+class AnisotropyValue(enum.IntEnum):
+    VH = 0
+    VV = 1
+    VM = 2
+    HH = 3
+    HV = 4
+    HM = 5
+    AA = 6
+
+
+def _to_enum[E: enum.IntEnum](cls: type[E], value: int) -> E | int:
+    """Return the member of cls for value, or value itself if unknown.
+    """
+    try:
+        return cls(value)
+    except ValueError:
+        return value
+
+
+# CreationDate is given as days since this epoch (OLE Automation date).
+_ETC_EPOCH = datetime.datetime(1899, 12, 30)
+_SECONDS_PER_DAY = 86400.0
+
+
+def safe_decode_str(s: bytes | memoryview | None) -> str:
+    """Decode an ascii char array, replacing invalid bytes and
+    stripping trailing null characters.
+    """
     if s is None:
         return ""
-    try:
-        return s.decode("ascii")
-    except:
-        return "?"
+    return str(s, "ascii", "replace").rstrip("\x00")
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class SystemParameter:
     identity: str
     display_name: str
@@ -36,7 +88,7 @@ class SystemParameter:
     data: int | float | str
 
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class SeriesParameter:
     identity: str
     display_name: str
@@ -47,7 +99,7 @@ class SeriesParameter:
     step: float
     end: float
 
-@dataclasses.dataclass(frozen=True)
+@dataclasses.dataclass(frozen=True, slots=True)
 class MeasurementParameter:
     identity: str
     display_name: str
@@ -57,208 +109,210 @@ class MeasurementParameter:
     data: int | float | str
 
 
-@dataclasses.dataclass(frozen=True)
+# __eq__ and __hash__ are written by hand, as arrays are neither
+# comparable to a single bool nor hashable.
+@dataclasses.dataclass(frozen=True, slots=True, eq=False)
 class DataCurve:
-    curve_type_value: int
-    anisotropy_value: int 
+    curve_type_value: CurveTypeValue | int
+    anisotropy_value: AnisotropyValue | int
     measurement_parameters: tuple[MeasurementParameter, ...]
     resolution: float
     first_x: float
-    x: tuple[float, ...]
-    y: tuple[int, ...]
+    x: np.ndarray
+    y: np.ndarray
+
+    def _key(self) -> tuple:
+        return (
+            self.curve_type_value,
+            self.anisotropy_value,
+            self.measurement_parameters,
+            self.resolution,
+            self.first_x,
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (
+            self._key() == other._key()  # type: ignore
+            and np.array_equal(self.x, other.x)  # type: ignore
+            and np.array_equal(self.y, other.y)  # type: ignore
+        )
+
+    def __hash__(self) -> int:
+        return hash((self._key(), self.x.tobytes(), self.y.tobytes()))
 
     @property
     def curve_type(self) -> CurveType:
-        match self.curve_type_value:
-            case 0: 
-                return "IRF"
-            case 1: 
-                return "Decay"
-            case 2: 
-                return "Spectrum"
-            case 3: 
-                return "Arbitrary"
-            case _ as x:
-                raise ValueError(f"Unknown curve type {x}")  
+        if not isinstance(self.curve_type_value, CurveTypeValue):
+            raise ValueError(f"Unknown curve type {self.curve_type_value}")
+        return self.curve_type_value.name  # type: ignore
 
     @property
     def anistropy(self) -> AnisotropyType:
-        match self.anisotropy_value:
-            case 0: 
-                return "VH"
-            case 1: 
-                return "VV"
-            case 2: 
-                return "VM"
-            case 3: 
-                return "HH"
-            case 4:
-                return "HV"
-            case 5:
-                return "HM"
-            case 6:
-                return "AA"
-            case _ as x:
-                raise ValueError(f"Unknown curve type {x}")  
-
-
-@dataclasses.dataclass(frozen=True)
+        if not isinstance(self.anisotropy_value, AnisotropyValue):
+            raise ValueError(f"Unknown anisotropy {self.anisotropy_value}")
+        return self.anisotropy_value.name  # type: ignore
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
 class ETCFile:
     identity: str
     version: int
     guid: str
     creation_date: datetime.datetime
-    measurement_context_value: int
+    measurement_context_value: MeasContextValue | int
     system_parameters: tuple[SystemParameter, ...]
     series_parameters: tuple[SeriesParameter, ...]
     data_curves: tuple[DataCurve, ...]
 
     @property
     def measurement_context(self) -> MeasContext:
-        match self.measurement_context_value:
-            case 0: 
-                return "Unknown"
-            case 1: 
-                return  "Decay"
-            case 2: 
-                return  "TRES"
-            case 3: 
-                return  "AnisoDecay"
-            case 4: 
-                return  "DecayTempSeries"
-            case 5: 
-                return  "DecayTimeSeries"
-            case 6: 
-                return  "FluorSpec"
-            case 7: 
-                return  "ExSpec"
-            case 8: 
-                return  "FluorAnisoSpec"
-            case 9: 
-                return  "ExAnisoSpec"
-            case 10: 
-                return  "FluorSpecTimeSeries"
-            case 11: 
-                return  "ExSpecTimeSeries"
-            case 12: 
-                return  "FluorSpecTempSeries"
-            case 13: 
-                return  "FluorSpecTempSeries"
-            case _ as x:
-                raise ValueError(f"Unknown measurement context {x}")
+        if not isinstance(self.measurement_context_value, MeasContextValue):
+            raise ValueError(
+                f"Unknown measurement context {self.measurement_context_value}"
+            )
+        return self.measurement_context_value.name  # type: ignore
+
+
+_GUID = struct.Struct("<IHH2s6s")
 
 
 def bytes_to_guid(byte_string: bytes) -> str:
     """Convert a byte string to a Microsoft GUID"""
     
     # The Microsoft GUID format has five fields separated by dashes.  
-    # since the endianness is mixed, we need to reverse the first three fields. 
+    # since the endianness is mixed, the first three fields are read
+    # as little endian integers and the last two as bytes.
     # https://en.wikipedia.org/wiki/Universally_unique_identifier#Encoding
-    
-    # big endian components, we swap the endianness 
-    A = (bytes(reversed(component))
-         for component
-         in struct.unpack_from('4s2s2s', byte_string, 0))
+    a, b, c, d, e = _GUID.unpack_from(byte_string, 0)
+    return f"{a:08x}-{b:04x}-{c:04x}-{d.hex()}-{e.hex()}"
 
-    # little endian components, good as is. 
-    B = struct.unpack_from('2s6s', byte_string, 8)
 
-    return '-'.join(c.hex() for c in chain(A,B))
+_I32 = struct.Struct(build_format(I32, byte_order_sigil))
+_I64 = struct.Struct(build_format(I64, byte_order_sigil))
+_F64 = struct.Struct(build_format(F64, byte_order_sigil))
 
 
 def _get_data(par_type: int, size: int, data: bytes) -> int | float | str:
     match par_type:
         case 0: # pdfInteger
             if size == 4:
-                out = struct.unpack(build_format(I32, byte_order_sigil), data)[0]
+                return _I32.unpack_from(data)[0]
             elif size == 8:
-                out = struct.unpack(build_format(I64, byte_order_sigil), data)[0]
+                return _I64.unpack_from(data)[0]
             else: 
                 raise ValueError(f"Invalid size {size} for {par_type}")
-            return int(out)
         case 1: # pdfFloat
             assert size == 8
-            return float(struct.unpack(build_format(F64, byte_order_sigil), data)[0])
+            return _F64.unpack_from(data)[0]
         case 2: # pdfString
             return safe_decode_str(data)
         case _:
             raise ValueError(f"Unknown ParType: {par_type}")
 
 
-def read(path: pathlib.Path | str):
-    if isinstance(path, str):
-        path = pathlib.Path(path)
-    
-    content = llread(ContainerFile, path.read_bytes())
-    assert content["Ident"] == b'EasyTau Container\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00' 
+def _build_system_parameter(value: lowlevel.SysParam) -> SystemParameter:
+    return SystemParameter(
+        identity=safe_decode_str(value["SysParIdent"]),
+        display_name=safe_decode_str(value["SysParDispNm"]),
+        unit=safe_decode_str(value["SysParUnit"]),
+        prefix=safe_decode_str(value["SysParPrefix"]),
+        precision=value["Precision"],
+        data=_get_data(value["ParType"], value["Size"], value["Data"]),
+    )
 
-    system_parameters: list[SystemParameter] = []
-    for value in content["SysParam"]:
-        system_parameters.append(
-            SystemParameter(
-                identity=safe_decode_str(value["SysParIdent"]),
-                display_name=safe_decode_str(value["SysParDispNm"]),
-                unit=safe_decode_str(value["SysParUnit"]),
-                prefix=safe_decode_str(value["SysParPrefix"]),
-                precision=value["Precision"],
-                data=_get_data(value["ParType"], value["Size"], value["Data"]),
-            )
-        )
 
-        system_parameters: list[SystemParameter] = []
-
-    series_parameters: list[SeriesParameter] = []
-    for value in content["SeriesParam"]:
-        series_parameters.append(
-            SeriesParameter(
-                identity=safe_decode_str(value["SeriesParIdent"]),
-                display_name=safe_decode_str(value["SeriesParDispNm"]),
-                unit=safe_decode_str(value["SeriesParUnit"]),
-                prefix=safe_decode_str(value["SeriesParPrefix"]),
-                precision=value["Precision"],
-                start=value["Start"],
-                step=value["Step"],
-                end=value["End"]
-            )
-        )
+def _build_series_parameter(value: lowlevel.SeriesParam) -> SeriesParameter:
+    return SeriesParameter(
+        identity=safe_decode_str(value["SeriesParIdent"]),
+        display_name=safe_decode_str(value["SeriesParDispNm"]),
+        unit=safe_decode_str(value["SeriesParUnit"]),
+        prefix=safe_decode_str(value["SeriesParPrefix"]),
+        precision=value["Precision"],
+        start=value["Start"],
+        step=value["Step"],
+        end=value["End"]
+    )
 
-    data_curves: list[DataCurve] = []
-    measurement_parameters: list[MeasurementParameter] = []
-    for value in content["Curve"]:
-        measurement_parameters.clear()
-        for subvalue in value["MeasParam"]:
-            measurement_parameters.append(
-                MeasurementParameter(
-                    identity=safe_decode_str(subvalue["MeasParIdent"]),
-                    display_name=safe_decode_str(subvalue["SeriesParDispNm"]),
-                    unit=safe_decode_str(subvalue["SeriesParUnit"]),
-                    prefix=safe_decode_str(subvalue["SeriesParPrefix"]),
-                    precision=subvalue["Precision"],
-                    data=_get_data(subvalue["ParType"], subvalue["Size"], subvalue["Data"])
-                )
-            )
-        el = DataCurve(
-            curve_type_value=value["CurveType"],
-            anisotropy_value=value["Anisotropy"],
-            measurement_parameters=tuple(measurement_parameters),
-            resolution=value["Resolution"],
-            first_x=value["FirstX"],
-            x=tuple(item["X"] for item in value["XY"]),
-            y=tuple(item["Y"] for item in value["XY"]),
-        )
-        data_curves.append(el)
+
+def _build_measurement_parameter(value: lowlevel.MeasParam) -> MeasurementParameter:
+    return MeasurementParameter(
+        identity=safe_decode_str(value["MeasParIdent"]),
+        display_name=safe_decode_str(value["SeriesParDispNm"]),
+        unit=safe_decode_str(value["SeriesParUnit"]),
+        prefix=safe_decode_str(value["SeriesParPrefix"]),
+        precision=value["Precision"],
+        data=_get_data(value["ParType"], value["Size"], value["Data"])
+    )
 
 
+def _build_data_curve(value: lowlevel.DataCurve) -> DataCurve:
+    # XY is a little endian structured array viewing the file buffer.
+    # Columns are copied to native byte order, so that the buffer can
+    # be released (and swapped in a single pass on big endian hosts).
+    x = value["XY"]["X"].astype(np.float32)
+    y = value["XY"]["Y"].astype(np.int32)
+    x.flags.writeable = False
+    y.flags.writeable = False
+
+    # MeasParam has already been converted to MeasurementParameter.
+    return DataCurve(
+        curve_type_value=_to_enum(CurveTypeValue, value["CurveType"]),
+        anisotropy_value=_to_enum(AnisotropyValue, value["Anisotropy"]),
+        measurement_parameters=tuple(value["MeasParam"]),
+        resolution=value["Resolution"],
+        first_x=value["FirstX"],
+        x=x,
+        y=y,
+    )
+
+
+def _build_etc_file(content: lowlevel.ContainerFile) -> ETCFile:
+    # SysParam, SeriesParam and Curve have already been converted.
+    assert content["Ident"] == b'EasyTau Container\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00\x00' 
+
     return ETCFile(
         identity=safe_decode_str(content["Ident"].strip(b"\x00")),
         version=content["Version"],
         guid=bytes_to_guid(content["GUID"]),
-        creation_date=datetime.datetime(1899, 12, 30) + datetime.timedelta(content["CreationDate"]),
-        measurement_context_value=content["MeasContext"],
-        system_parameters=tuple(system_parameters),
-        series_parameters=tuple(series_parameters),
-        data_curves=tuple(data_curves),
+        creation_date=_ETC_EPOCH + datetime.timedelta(
+            seconds=content["CreationDate"] * _SECONDS_PER_DAY
+        ),
+        measurement_context_value=_to_enum(MeasContextValue, content["MeasContext"]),
+        system_parameters=tuple(content["SysParam"]),
+        series_parameters=tuple(content["SeriesParam"]),
+        data_curves=tuple(content["Curve"]),
     )
 
 
+# Records are converted to high level objects as soon as they are read.
+_BUILDERS = {
+    lowlevel.SysParam: _build_system_parameter,
+    lowlevel.SeriesParam: _build_series_parameter,
+    lowlevel.MeasParam: _build_measurement_parameter,
+    lowlevel.DataCurve: _build_data_curve,
+    lowlevel.ContainerFile: _build_etc_file,
+}
+
+
+def read(path: pathlib.Path | str):
+    if isinstance(path, str):
+        path = pathlib.Path(path)
 
+    with open(path, "rb") as fi:
+        mm = mmap.mmap(fi.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            # Records are converted while reading, so no array
+            # viewing the map outlives a successful parse.
+            content = llread(lowlevel.ContainerFile, mm, _BUILDERS)
+        except BaseException:
+            # The traceback may still reference arrays viewing the map,
+            # in which case it is closed when they are released.
+            try:
+                mm.close()
+            except BufferError:
+                pass
+            raise
+        mm.close()
+        return content
@@ -0,0 +1,38 @@
+import struct
+from typing import Annotated
+
+import numpy as np
+
+from etcreader import binary
+
+
+class Point(binary.LittleEndian):
+    X: binary.F32
+    Y: binary.I32
+
+
+class Curve(binary.LittleEndian):
+    NumPoints: binary.I32
+    Points: Annotated[list[Point], "NumPoints"]
+
+
+BUFFER = struct.pack("<ifififi", 3, 0.0, 1, 0.5, 2, 1.0, 3)
+
+
+def test_read_array():
+    content = binary.read(Curve, BUFFER)
+    assert isinstance(content["Points"], np.ndarray)
+    np.testing.assert_array_equal(content["Points"]["Y"], [1, 2, 3])
+
+
+def test_read_array_with_builder():
+    content = binary.read(Curve, BUFFER, {Point: lambda r: (r["X"], r["Y"])})
+    assert content["Points"] == ((0.0, 1), (0.5, 2), (1.0, 3))
+
+
+def test_schema_cache_independent_of_builders():
+    binary.read(Curve, BUFFER, {Point: lambda r: r})
+    size = len(binary._SCHEMA_CACHE)
+    for _ in range(3):
+        binary.read(Curve, BUFFER, {Point: lambda r: r, Curve: lambda r: r})
+    assert len(binary._SCHEMA_CACHE) == size
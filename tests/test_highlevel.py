@@ -0,0 +1,211 @@
+import struct
+
+import numpy as np
+import pytest
+
+from etcreader import highlevel, lowlevel
+from etcreader.highlevel import read, safe_decode_str
+
+GUID = bytes(range(16))
+
+
+def _char_array(value: bytes) -> bytes:
+    return struct.pack("<i", len(value)) + value
+
+
+def _parameter(ident: bytes, par_type: int, data: bytes) -> bytes:
+    return (
+        _char_array(ident)
+        + _char_array(b"Display " + ident)
+        + _char_array(b"s")
+        + _char_array(b"m")
+        + struct.pack("<iii", 3, par_type, len(data))
+        + data
+    )
+
+
+def _curve(
+        curve_type: int = 1,
+        num_points: int | None = None,
+        xy: tuple[tuple[float, int], ...] = ((0.0, 1), (0.5, 2), (1.0, 3)),
+        ) -> bytes:
+    if num_points is None:
+        num_points = len(xy)
+    return (
+        struct.pack("<iiffi", curve_type, 1, 0.1, 2.0, 1)
+        + _parameter(b"meas", 1, struct.pack("<d", 1.5))
+        + struct.pack("<i", num_points)
+        + b"".join(struct.pack("<fi", x, y) for x, y in xy)
+    )
+
+
+def make_etc(
+        meas_context: int = 1,
+        system_parameters: tuple[bytes, ...] = (
+            _parameter(b"int", 0, struct.pack("<i", 42)),
+            _parameter(b"float", 1, struct.pack("<d", 2.5)),
+            _parameter(b"str", 2, b"hello\x00\x00"),
+        ),
+        curves: tuple[bytes, ...] = (_curve(),),
+        system_parameter_count: int | None = None,
+        ) -> bytes:
+    if system_parameter_count is None:
+        system_parameter_count = len(system_parameters)
+    return (
+        b"EasyTau Container".ljust(32, b"\x00")
+        + struct.pack("<i", 3)
+        + GUID
+        + struct.pack("<di", 45000.5, meas_context)
+        + struct.pack("<i", system_parameter_count) + b"".join(system_parameters)
+        + struct.pack("<i", 1) + _char_array(b"temp") + _char_array(b"Temperature")
+        + _char_array(b"C") + _char_array(b"") + struct.pack("<ifff", 2, 0.0, 0.5, 10.0)
+        + struct.pack("<i", len(curves)) + b"".join(curves)
+    )
+
+
+@pytest.fixture
+def write_etc(tmp_path):
+    def _write(content: bytes):
+        path = tmp_path / "test.etc"
+        path.write_bytes(content)
+        return path
+    return _write
+
+
+def test_read(write_etc):
+    etc = read(write_etc(make_etc()))
+    assert etc.identity == "EasyTau Container"
+    assert etc.version == 3
+    assert etc.creation_date.isoformat() == "2023-03-15T12:00:00"
+    assert len(etc.series_parameters) == 1
+    assert etc.series_parameters[0].prefix == ""
+    assert etc.series_parameters[0].end == 10.0
+    assert len(etc.data_curves) == 1
+    assert etc.data_curves[0].measurement_parameters[0].data == 1.5
+
+
+def test_system_parameters(write_etc):
+    etc = read(write_etc(make_etc()))
+    assert len(etc.system_parameters) == 3
+    assert [p.identity for p in etc.system_parameters] == ["int", "float", "str"]
+    assert [p.data for p in etc.system_parameters] == [42, 2.5, "hello"]
+
+
+def test_guid(write_etc):
+    etc = read(write_etc(make_etc()))
+    assert etc.guid == "03020100-0504-0706-0809-0a0b0c0d0e0f"
+
+
+def test_safe_decode_str():
+    assert safe_decode_str(None) == ""
+    assert safe_decode_str(b"abc\x00\x00") == "abc"
+    assert safe_decode_str(b"a\xffb") == "a�b"
+    assert safe_decode_str(memoryview(b"abc")) == "abc"
+
+
+def test_measurement_context(write_etc):
+    etc = read(write_etc(make_etc(meas_context=13)))
+    assert etc.measurement_context_value == 13
+    assert etc.data_curves[0].curve_type == "Decay"
+    assert etc.data_curves[0].anistropy == "VV"
+    assert etc.measurement_context == "ExSpecTempSeries"
+
+
+def test_unknown_codes(write_etc):
+    etc = read(write_etc(make_etc(meas_context=20, curves=(_curve(curve_type=9),))))
+    assert etc.measurement_context_value == 20
+    assert etc.data_curves[0].curve_type_value == 9
+    with pytest.raises(ValueError, match="Unknown measurement context 20"):
+        etc.measurement_context
+    with pytest.raises(ValueError, match="Unknown curve type 9"):
+        etc.data_curves[0].curve_type
+
+
+def test_data_curve_xy(write_etc):
+    curve = read(write_etc(make_etc())).data_curves[0]
+    assert isinstance(curve.x, np.ndarray)
+    assert isinstance(curve.y, np.ndarray)
+    assert curve.x.dtype == np.float32
+    assert curve.y.dtype == np.int32
+    np.testing.assert_array_equal(curve.x, [0.0, 0.5, 1.0])
+    np.testing.assert_array_equal(curve.y, [1, 2, 3])
+
+
+def test_data_curve_frozen(write_etc):
+    etc = read(write_etc(make_etc()))
+    curve = etc.data_curves[0]
+    assert not curve.x.flags.writeable
+    assert not curve.y.flags.writeable
+    with pytest.raises(ValueError):
+        curve.x[0] = 1.0
+
+
+def test_eq_and_hash(write_etc):
+    path = write_etc(make_etc())
+    etc_a, etc_b = read(path), read(path)
+    assert etc_a == etc_b
+    assert etc_a.data_curves[0] == etc_b.data_curves[0]
+    assert hash(etc_a) == hash(etc_b)
+    assert hash(etc_a.data_curves[0]) == hash(etc_b.data_curves[0])
+
+
+def test_eq_different_y(write_etc):
+    etc_a = read(write_etc(make_etc(curves=(_curve(xy=((0.0, 1), (0.5, 2))),))))
+    etc_b = read(write_etc(make_etc(curves=(_curve(xy=((0.0, 100), (0.5, 200))),))))
+    assert etc_a.data_curves[0] != etc_b.data_curves[0]
+    assert etc_a != etc_b
+
+
+def test_data_curve_empty(write_etc):
+    curve = read(write_etc(make_etc(curves=(_curve(xy=()),)))).data_curves[0]
+    assert curve.x.shape == (0,)
+    assert curve.y.shape == (0,)
+
+
+def test_negative_num_points(write_etc):
+    path = write_etc(make_etc(curves=(_curve(num_points=-1, xy=()),)))
+    with pytest.raises(ValueError, match="Invalid length -1 for field XY"):
+        read(path)
+
+
+def test_malformed_file(write_etc):
+    # Unknown ParType in the measurement parameter of the curve.
+    curve = _curve().replace(struct.pack("<iii", 3, 1, 8), struct.pack("<iii", 3, 7, 8))
+    path = write_etc(make_etc(curves=(curve,)))
+    with pytest.raises(ValueError, match="Unknown ParType: 7"):
+        read(path)
+
+
+def test_builder_error_with_live_array(write_etc, monkeypatch):
+    # The record holds an array viewing the file map when the builder fails.
+    def _fail(value):
+        raise RuntimeError("builder failed")
+
+    monkeypatch.setitem(highlevel._BUILDERS, lowlevel.DataCurve, _fail)
+    with pytest.raises(RuntimeError, match="builder failed") as excinfo:
+        read(write_etc(make_etc()))
+    # Frame locals are kept for post mortem debugging.
+    assert "value" in excinfo.traceback[-1].frame.f_locals
+
+
+def test_interrupt_with_live_array(write_etc, monkeypatch):
+    def _interrupt(value):
+        raise KeyboardInterrupt
+
+    monkeypatch.setitem(highlevel._BUILDERS, lowlevel.DataCurve, _interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        read(write_etc(make_etc()))
+
+
+def test_truncated_file(write_etc):
+    content = make_etc()
+    # Cut the file in the middle of the first system parameter identity.
+    path = write_etc(content[:content.index(b"int") + 1])
+    with pytest.raises(struct.error):
+        read(path)
+
+
+def test_negative_system_parameter_count(write_etc):
+    path = write_etc(make_etc(system_parameters=(), system_parameter_count=-3))
+    with pytest.raises(ValueError, match="Invalid length -3 for field SysParam"):
+        read(path)